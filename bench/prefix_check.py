@@ -0,0 +1,89 @@
+"""Per-message cost of ignoring a chat message: old path vs. new pre-check.
+
+Old: every message went through `get_context()` with a prefix callable that
+read BOT_PREFIX and built a `when_mentioned_or` closure each time.
+New: `MusicBot.on_message` rejects on a `startswith` before any Context.
+
+Run from the repository root with the bot's requirements installed:
+
+    python bench/prefix_check.py [iterations]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+TMP = tempfile.mkdtemp()
+os.environ.setdefault("BOT_PREFIX", "!")
+os.environ["LOG_DIR"] = os.path.join(TMP, "logs")
+os.environ["PREFIX_DB"] = os.path.join(TMP, "prefixes.db")
+
+from discord.ext import commands  # noqa: E402
+
+from bot import MusicBot  # noqa: E402
+
+GUILD_ID = 1234
+BOT_ID = 42
+CHAT = "did anyone catch the match last night? that last goal was unreal"
+
+
+async def old_prefix(bot, msg):
+    return commands.when_mentioned_or(os.getenv("BOT_PREFIX"))(bot, msg)
+
+
+def make_message(bot, content):
+    return types.SimpleNamespace(
+        id=1,
+        content=content,
+        guild=types.SimpleNamespace(id=GUILD_ID),
+        author=types.SimpleNamespace(id=7, bot=False),
+        channel=types.SimpleNamespace(id=2),
+        _state=bot._connection,
+    )
+
+
+async def per_message(fn, msg, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await fn(msg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main(iterations):
+    bot = MusicBot()
+    bot._connection.user = types.SimpleNamespace(id=BOT_ID)
+    bot._mentions = [f"<@{BOT_ID}> ", f"<@!{BOT_ID}> "]
+    msg = make_message(bot, CHAT)
+
+    async def empty(msg):
+        pass
+
+    async def old_path(msg):
+        # What the old process_commands did for every non-bot message.
+        ctx = await bot.get_context(msg, cls=commands.Context)
+        assert ctx.command is None
+
+    bot.prefixes.get(GUILD_ID)  # warm the cache, as after the first message
+    new = await per_message(bot.on_message, msg, iterations)
+    baseline = await per_message(empty, msg, iterations)
+
+    bot.command_prefix = old_prefix
+    old = await per_message(old_path, msg, iterations)
+
+    print(f"iterations:          {iterations:,}")
+    print(f"call overhead:       {baseline:7.2f} us")
+    print(f"old (get_context):   {old - baseline:7.2f} us/message")
+    print(f"new (pre-check):     {new - baseline:7.2f} us/message")
+    print(f"speedup:             {(old - baseline) / max(new - baseline, 1e-9):7.1f}x")
+
+    bot.prefixes.close()
+    bot.log_listener.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from enum import Enum
+
+from discord.ext import commands
+
+log = logging.getLogger(__name__)
+
+
+class NodeOverloaded(commands.CommandError):
+    pass
+
+
+class LoadLevel(Enum):
+    NORMAL = 0
+    BUSY = 1
+    OVERLOADED = 2
+
+
+class AdmissionController:
+    """Decides what new work Lavalink can take on, from its stats events.
+
+    Load is shed in a fixed order so players that are already running keep
+    clean audio:
+
+    - BUSY: low-priority background work (warm idle connections, library
+      rescans) stops.
+    - OVERLOADED: no new players are created; joins wait for capacity or are
+      refused.
+
+    Pressure is the highest of CPU load, frame deficit and nulled frames, each
+    relative to its limit. A level is entered at its threshold and only left
+    once pressure drops `hysteresis` below it, so the bot doesn't flap.
+    """
+
+    def __init__(self, bot, max_cpu=0.85, max_deficit=250, max_nulled=150, busy_at=0.8, hysteresis=0.1):
+        self.bot = bot
+        self.max_cpu = max_cpu
+        self.max_deficit = max_deficit
+        self.max_nulled = max_nulled
+        self.busy_at = busy_at
+        self.hysteresis = hysteresis
+        self.level = LoadLevel.NORMAL
+        self.pressure = 0.0
+        self._capacity = None
+
+    @property
+    def background_allowed(self):
+        return self.level == LoadLevel.NORMAL
+
+    @property
+    def overloaded(self):
+        return self.level == LoadLevel.OVERLOADED
+
+    def _capacity_event(self):
+        if self._capacity is None:
+            self._capacity = asyncio.Event()
+            if not self.overloaded:
+                self._capacity.set()
+        return self._capacity
+
+    def _target(self, pressure):
+        for level, at in ((LoadLevel.OVERLOADED, 1.0), (LoadLevel.BUSY, self.busy_at)):
+            if pressure >= at or (self.level.value >= level.value and pressure >= at - self.hysteresis):
+                return level
+        return LoadLevel.NORMAL
+
+    def update(self, payload):
+        """Feeds a `wavelink.StatsEventPayload` into the controller."""
+        cpu = max(payload.cpu.system_load, payload.cpu.lavalink_load)
+        # Frame stats are per-player averages over the last minute and are
+        # missing while nothing is playing.
+        deficit = payload.frames.deficit if payload.frames else 0
+        nulled = payload.frames.nulled if payload.frames else 0
+
+        self.pressure = max(cpu / self.max_cpu, deficit / self.max_deficit, nulled / self.max_nulled)
+        level = self._target(self.pressure)
+        if level == self.level:
+            return
+
+        old, self.level = self.level, level
+        log.warning(
+            "Lavalink load level %s -> %s.", old.name, level.name,
+            extra={"cpu": cpu, "deficit": deficit, "nulled": nulled, "players": payload.playing},
+        )
+
+        if self.overloaded:
+            self._capacity_event().clear()
+        else:
+            self._capacity_event().set()
+
+        self.bot.dispatch("load_level_change", old, level)
+
+    async def wait_for_capacity(self, timeout):
+        """Waits up to `timeout` seconds for the node to accept new players.
+
+        Raises `NodeOverloaded` if it doesn't in time.
+        """
+        if not self.overloaded:
+            return
+
+        try:
+            await asyncio.wait_for(self._capacity_event().wait(), timeout)
+        except asyncio.TimeoutError:
+            raise NodeOverloaded from None
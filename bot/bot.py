@@ -5,51 +5,78 @@ import discord
 from discord.ext import commands
 
 from dotenv import load_dotenv
+import logging
 import os
 import wavelink
 
+from .admission import AdmissionController, NodeOverloaded
+from .log import guild_context, setup_logging
+from .prefixes import PrefixStore
+from .scheduler import GuildBusy, GuildScheduler
+
 load_dotenv(".env")
 
+log = logging.getLogger(__name__)
+
 class MusicBot(commands.Bot):
     def __init__(self):
         # command_sync_flags = commands.CommandSyncFlags.default()
         # command_sync_flags.sync_commands_debug = True
         self._cogs = [p.stem for p in Path(".").glob("./bot/cogs/*.py")]
+        self.log_listener = setup_logging()
+        self.scheduler = GuildScheduler(
+            workers=int(os.getenv("SCHEDULER_WORKERS", 16)),
+            mailbox_size=int(os.getenv("SCHEDULER_MAILBOX_SIZE", 8)),
+        )
+        self.admission = AdmissionController(
+            self,
+            max_cpu=float(os.getenv("ADMISSION_MAX_CPU", 0.85)),
+            max_deficit=int(os.getenv("ADMISSION_MAX_DEFICIT", 250)),
+            max_nulled=int(os.getenv("ADMISSION_MAX_NULLED", 150)),
+        )
+        self.admission_join_wait = float(os.getenv("ADMISSION_JOIN_WAIT", 10))
+        self.prefixes = PrefixStore(os.getenv("PREFIX_DB", "data/prefixes.db"), os.getenv("BOT_PREFIX"))
+        self._mentions = []
         super().__init__(command_prefix=self.prefix, case_insensitive=True, intents=discord.Intents.all())
 
     async def setup(self):
-        print("Running setup...")
+        log.info("Running setup...")
 
         for cog in self._cogs:
             await self.load_extension(f"bot.cogs.{cog}")
-            print(f" Loaded `{cog}` cog.")
+            log.info("Loaded `%s` cog.", cog)
 
-        print("Setup complete.")
+        log.info("Setup complete.")
 
     async def run(self):
         await self.setup()
 
         TOKEN = os.getenv("DISCORD_TOKEN")
 
-        print("Running bot...")
-        super().run(TOKEN, reconnect=True)
+        log.info("Running bot...")
+        # discord.py's default handler writes to stderr synchronously; let its
+        # records propagate to our queue-backed root logger instead.
+        super().run(TOKEN, reconnect=True, log_handler=None)
 
     async def shutdown(self):
-        print("Closing connection to Discord...")
+        log.info("Closing connection to Discord...")
+        await self.scheduler.stop()
         await super().close()
+        self.prefixes.close()
+        self.log_listener.stop()
 
     async def close(self):
-        print("Closing on keyboard interrupt...")
+        log.info("Closing on keyboard interrupt...")
         await self.shutdown()
 
     async def on_connect(self):
-        print(f" Connected to Discord (latency: {self.latency*1000:,.0f} ms).")
+        log.info("Connected to Discord (latency: %.0f ms).", self.latency * 1000)
 
     async def on_resumed(self):
-        print("Bot resumed.")
+        log.info("Bot resumed.")
 
     async def on_disconnect(self):
-        print("Bot disconnected.")
+        log.warning("Bot disconnected.")
 
     async def on_error(self, err, *args, **kwargs):
         raise
@@ -59,24 +86,72 @@ class MusicBot(commands.Bot):
 
     async def on_ready(self):
         self.client_id = (await self.application_info()).id
-        print("Bot ready.")
+        log.info("Bot ready.")
+
+    async def on_wavelink_stats_update(self, payload):
+        self.admission.update(payload)
+
+    def guild_prefix(self, msg):
+        return self.prefixes.get(msg.guild.id) if msg.guild else self.prefixes.default
 
     async def prefix(self, bot, msg):
-        return commands.when_mentioned_or(os.getenv("BOT_PREFIX"))(bot, msg)
+        return [*self._mentions, self.guild_prefix(msg)]
+
+    def might_be_command(self, msg):
+        # Almost every message we see is chat. A startswith on the raw content
+        # rules those out before get_context() builds a Context; "<@" lets
+        # mention prefixes through to the full check.
+        return msg.content.startswith((self.guild_prefix(msg), "<@"))
 
     async def process_commands(self, msg):
+        guild_context.set(msg.guild.id if msg.guild else None)
         ctx = await self.get_context(msg, cls=commands.Context)
 
-        if ctx.command is not None:
-            await self.invoke(ctx)
+        if ctx.command is None:
+            return
+
+        # Wait for Lavalink capacity here, before the command takes a mailbox
+        # slot or a worker; a join held back by overload must never delay the
+        # track changes of guilds that are already playing.
+        if ctx.command.extras.get("starts_player") and ctx.guild and ctx.voice_client is None:
+            try:
+                await self.admit_player(ctx)
+            except NodeOverloaded:
+                return await ctx.send(
+                    "The music server is overloaded, so new players are paused to keep current "
+                    "listeners' audio clean. Try again in a minute."
+                )
+
+        # Commands that wait on people or the network (search, the track
+        # picker, lyrics) opt out with `extras={"serialize": False}` and submit
+        # only their state changes, so they never hold the guild's mailbox.
+        if ctx.guild is None or not ctx.command.extras.get("serialize", True):
+            return await self.invoke(ctx)
+
+        # Commands for one guild run one at a time, in arrival order, so they
+        # never interleave on that guild's queue and player.
+        try:
+            await self.scheduler.submit(ctx.guild.id, self.invoke(ctx))
+        except GuildBusy:
+            log.warning("Mailbox full, dropped `%s`.", ctx.command.qualified_name)
+            await ctx.send("Too many commands are waiting for this server, try again in a moment.")
+
+    async def admit_player(self, ctx):
+        if self.admission.overloaded:
+            await ctx.send("The music server is under heavy load, waiting for room to start a new player...")
+        await self.admission.wait_for_capacity(self.admission_join_wait)
 
     async def on_message(self, msg):
-        if not msg.author.bot:
+        if not msg.author.bot and self.might_be_command(msg):
             await self.process_commands(msg)
             
     async def setup_hook(self) -> None:    
+        self.scheduler.start()
+        # The same strings commands.when_mentioned builds on every call.
+        self._mentions = [f"<@{self.user.id}> ", f"<@!{self.user.id}> "]
+
         # Wavelink 2.0 has made connecting Nodes easier... Simply create each Node
         # and pass it to NodePool.connect with the client/bot.
         node: wavelink.Node = wavelink.Node(identifier="MAIN", uri='http://localhost:2333', password='youshallnotpass')
-        print(f" Wavelink node `{node.identifier}` ready.")
+        log.info("Wavelink node `%s` ready.", node.identifier)
         await wavelink.Pool.connect(client=self, nodes=[node])
\ No newline at end of file
@@ -1,15 +1,26 @@
 import asyncio
+import collections
+import contextlib
 import datetime as dt
 import enum
+import logging
+import os
 import random
 import re
 import typing as t
 from enum import Enum
+from urllib.parse import urlsplit
 
 import aiohttp
 import discord
 import wavelink
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+from ..library import Library
+from ..log import guild_context
+from ..scheduler import GuildBusy
+
+log = logging.getLogger(__name__)
 
 
 # TODO: In the refactored code:
@@ -26,6 +37,21 @@ URL_REGEX = r"(?i)\b((?:https?://|www\d{0,3}[.]|[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^
 LYRICS_URL = "https://some-random-api.ml/lyrics?title="
 HZ_BANDS = (20, 40, 63, 100, 150, 250, 400, 450, 630, 1000, 1600, 2500, 4000, 10000, 16000)
 TIME_REGEX = r"([0-9]{1,2})[:ms](([0-9]{1,2})s?)?"
+FILTER_DEBOUNCE = 0.25
+# Seconds to stay in voice after the queue runs out, so the next play command
+# can skip the voice handshake. 0 leaves as soon as the queue ends.
+VOICE_KEEPALIVE = float(os.getenv("VOICE_KEEPALIVE", 0))
+# Local library: directories to index (os.pathsep-separated) and where the
+# index lives. The library is off unless LIBRARY_DIRS is set.
+LIBRARY_DIRS = [d for d in os.getenv("LIBRARY_DIRS", "").split(os.pathsep) if d]
+LIBRARY_INDEX = os.getenv("LIBRARY_INDEX", "data/library.db")
+LIBRARY_RESCAN_MINUTES = float(os.getenv("LIBRARY_RESCAN_MINUTES", 10))
+EQ_PRESETS = {
+    "flat": (0.0,) * 15,
+    "boost": (-0.075, 0.125, 0.125, 0.1, 0.1, 0.05, 0.075, 0.0, 0.0, 0.0, 0.0, 0.0, 0.125, 0.15, 0.05),
+    "metal": (0.0, 0.1, 0.1, 0.15, 0.13, 0.1, 0.0, 0.125, 0.175, 0.175, 0.125, 0.125, 0.1, 0.075, 0.0),
+    "piano": (-0.25, -0.25, -0.125, 0.0, 0.25, 0.25, 0.0, -0.25, -0.25, 0.0, 0.0, 0.5, 0.25, -0.025, 0.0),
+}
 OPTIONS = {
     "1️⃣": 0,
     "2⃣": 1,
@@ -105,6 +131,15 @@ class InvalidTimeString(commands.CommandError):
 class MissingRequiredArgument(commands.CommandError):
     pass
 
+class LibraryDisabled(commands.CommandError):
+    pass
+
+class UnsupportedURL(commands.CommandError):
+    pass
+
+class TimescaleOutOfBounds(commands.CommandError):
+    pass
+
 class RepeatMode(Enum):
     NONE = 0
     ONE = 1
@@ -187,6 +222,63 @@ class Queue:
         self._queue.clear()
         self.position = 0
 
+class FilterState:
+    """A guild's filters and volume, kept across tracks and players.
+
+    Filters are pushed to Lavalink lazily: every push makes Lavalink rebuild
+    the audio pipeline, so changes made within `FILTER_DEBOUNCE` seconds of
+    each other go out as one update.
+    """
+
+    def __init__(self):
+        self.volume = 100
+        self.eq_levels = list(EQ_PRESETS["flat"])
+        self.filters = wavelink.Filters()
+        self._push = None
+
+    def _apply_eq(self):
+        self.filters.equalizer.set(bands=[{"band": i, "gain": g} for i, g in enumerate(self.eq_levels)])
+
+    def set_preset(self, preset):
+        self.eq_levels[:] = EQ_PRESETS[preset]
+        self._apply_eq()
+
+    def set_band(self, band, gain):
+        self.eq_levels[band] = gain
+        self._apply_eq()
+
+    def set_timescale(self, **options):
+        # Only the given options (speed, pitch, rate) change.
+        self.filters.timescale.set(**options)
+
+    def reset(self):
+        self.eq_levels[:] = EQ_PRESETS["flat"]
+        self.filters.reset()
+
+    def schedule_push(self, player):
+        # Not in voice: the state is kept, and start_playback() sends it with
+        # the first track of the next player.
+        if player is None:
+            return
+        if self._push is None:
+            self._push = asyncio.create_task(self._flush(player))
+
+    def cancel(self):
+        if self._push is not None:
+            self._push.cancel()
+            self._push = None
+
+    async def _flush(self, player):
+        await asyncio.sleep(FILTER_DEBOUNCE)
+        # Anything changed from here on needs a push of its own.
+        self._push = None
+
+        try:
+            await player.set_filters(self.filters)
+        except Exception:
+            log.exception("Failed to push filters.")
+
+
 class Music(commands.Cog):
     def __init__(self, bot, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -194,16 +286,61 @@ class Music(commands.Cog):
         self.queues = {}
         self.voice_clients = {}
         self.players = {}
-        self.eq_levels = [0.] * 15
+        self.filters = {}
+        self.idle_timers = {}
+        self.connect_locks = {}
+        self.pending_plays = collections.Counter()
+        self.library = Library(LIBRARY_INDEX, LIBRARY_DIRS) if LIBRARY_DIRS else None
+
+    async def cog_load(self):
+        if self.library is not None:
+            self.library_rescan.start()
+
+    def cog_unload(self):
+        for state in self.filters.values():
+            state.cancel()
+        for timer in self.idle_timers.values():
+            timer.cancel()
+        if self.library is not None:
+            self.library_rescan.cancel()
+            self.library.close()
+
+    @tasks.loop(minutes=LIBRARY_RESCAN_MINUTES)
+    async def library_rescan(self):
+        if not self.bot.admission.background_allowed:
+            log.info("Skipping library rescan while Lavalink is busy.")
+            return
+
+        try:
+            changed, removed = await asyncio.get_running_loop().run_in_executor(None, self.library.scan)
+        except Exception:
+            # Keep the loop alive; the next rescan picks up where this one failed.
+            log.exception("Library rescan failed.")
+            return
+
+        if changed or removed:
+            log.info("Library rescanned: %d changed, %d removed.", changed, removed)
+
+    async def cog_before_invoke(self, ctx):
+        guild_context.set(ctx.guild.id if ctx.guild else None)
+        log.info("Invoking `%s`.", ctx.command.qualified_name, extra={"user_id": ctx.author.id})
+
+    async def cog_command_error(self, ctx, exc):
+        log.warning("`%s` failed: %r", ctx.command.qualified_name, exc)
 
     async def get_queue(self, guild_id):
         if guild_id not in self.queues:
             self.queues[guild_id] = Queue()
         return self.queues[guild_id]
 
+    async def get_filters(self, guild_id):
+        if guild_id not in self.filters:
+            self.filters[guild_id] = FilterState()
+        return self.filters[guild_id]
+
     async def get_voice_client(self, guild_id):
-        if guild_id not in self.voice_clients:
-            self.voice_clients[guild_id] = None
+        if self.voice_clients.get(guild_id) is None:
+            return wavelink.Pool.get_node().get_player(guild_id)
         return self.voice_clients[guild_id]
 
     async def get_player(self, guild_id):
@@ -214,8 +351,22 @@ class Music(commands.Cog):
     async def start_playback(self, guild_id):
         queue = await self.get_queue(guild_id)
         voice_client = await self.get_voice_client(guild_id)
-        if voice_client and not voice_client.is_playing():
-            await voice_client.play(queue.current_track)
+        if voice_client and not voice_client.playing:
+            # Past the end of a finished queue there is nothing to resume.
+            if (track := queue.current_track) is None:
+                raise QueueIsEmpty
+
+            log.info("Starting playback at position %d.", queue.position)
+            # The player may be new since the guild last played (idle
+            # disconnect), so send the guild's volume and filters along with
+            # the track.
+            if (state := self.filters.get(guild_id)) is None:
+                await voice_client.play(track)
+            else:
+                await voice_client.play(track, volume=state.volume, filters=state.filters)
+                # play() takes volume=0 to mean "leave it as it is".
+                if state.volume == 0 and voice_client.volume:
+                    await voice_client.set_volume(0)
 
     async def advance(self, guild_id):
         queue = await self.get_queue(guild_id)
@@ -223,32 +374,203 @@ class Music(commands.Cog):
         try:
             if (track := queue.get_next_track()) is not None:
                 await voice_client.play(track)
+            else:
+                log.info("Reached the end of the queue.")
+                self.schedule_idle_disconnect(guild_id)
         except QueueIsEmpty:
             pass
 
+    def schedule_idle_disconnect(self, guild_id):
+        self.cancel_idle_disconnect(guild_id)
+        # Warm connections are the first thing shed when Lavalink is busy.
+        delay = VOICE_KEEPALIVE if self.bot.admission.background_allowed else 0
+        self.idle_timers[guild_id] = asyncio.create_task(self._idle_disconnect(guild_id, delay))
+
+    def cancel_idle_disconnect(self, guild_id):
+        if (timer := self.idle_timers.pop(guild_id, None)) is not None:
+            timer.cancel()
+
+    async def _idle_disconnect(self, guild_id, delay):
+        await asyncio.sleep(delay)
+        self.idle_timers.pop(guild_id, None)
+
+        async def _disconnect():
+            # A play command may have started or been queued while we slept.
+            if self.pending_plays[guild_id]:
+                return
+            if (voice_client := await self.get_voice_client(guild_id)) and not voice_client.playing:
+                log.info("Leaving voice after %.0f s idle.", delay)
+                await voice_client.disconnect()
+
+        await self.bot.scheduler.submit(guild_id, _disconnect(), bounded=False)
+
+    @commands.Cog.listener()
+    async def on_load_level_change(self, old, new):
+        if not self.bot.admission.background_allowed:
+            for guild_id in list(self.idle_timers):
+                self.schedule_idle_disconnect(guild_id)
+
     async def repeat_track(self, guild_id):
         queue = await self.get_queue(guild_id)
         voice_client = await self.get_voice_client(guild_id)
         await voice_client.play(queue.current_track)
 
-    async def add_tracks(self, ctx, tracks):
-        guild_id = ctx.guild.id
+    @commands.Cog.listener()
+    async def on_wavelink_track_end(self, payload):
+        # Only natural ends move the queue on; commands that replace or stop
+        # the track have already updated it themselves.
+        if payload.player is None or payload.reason not in ("finished", "loadFailed"):
+            return
+
+        guild_id = payload.player.guild.id
         queue = await self.get_queue(guild_id)
-        voice_client = await self.get_voice_client(guild_id)
-        player = await self.get_player(guild_id)
+        if queue.repeat_mode == RepeatMode.ONE:
+            job = self.repeat_track(guild_id)
+        else:
+            job = self.advance(guild_id)
 
+        # Goes through the guild's mailbox so it can't interleave with a
+        # `!next` or `!skipto` that arrived at the same moment.
+        await self.bot.scheduler.submit(guild_id, job, bounded=False)
+
+    async def add_tracks(self, ctx, tracks):
+        """Works out what to queue from `tracks` and queues it.
+
+        Runs outside the guild's mailbox, since the track picker can wait a
+        minute on the user; only the queue update itself goes through it.
+        """
         if not tracks:
+            log.info("Search returned no tracks.")
             raise NoTracksFound
+        elif isinstance(tracks, wavelink.Playlist):
+            chosen = list(tracks)
+            message = f"Added {len(tracks)} tracks from {tracks.name} to the queue."
         elif len(tracks) == 1:
-            queue.add(tracks[0])
-            await ctx.send(f"Added {tracks[0].title} to the queue.")
+            chosen = [tracks[0]]
+            message = f"Added {tracks[0].title} to the queue."
+        elif (track := await self.choose_track(ctx, tracks)) is not None:
+            chosen = [track]
+            message = f"Added {track.title} to the queue."
         else:
-            if (track := await self.choose_track(ctx, tracks)) is not None:
-                queue.add(track)
-                await ctx.send(f"Added {track.title} to the queue.")
+            return
+
+        await self.bot.scheduler.submit(ctx.guild.id, self.enqueue(ctx.guild.id, chosen), bounded=False)
+        await ctx.send(message)
+
+    async def enqueue(self, guild_id, tracks):
+        queue = await self.get_queue(guild_id)
+        queue.add(*tracks)
+        await self.start_playback(guild_id)
+
+    async def connect(self, ctx):
+        """Returns the guild's player, joining the author's channel if needed.
+
+        Play commands run concurrently, so two of them can both find no
+        player; the lock makes the second one reuse the first's connection.
+        """
+        async with self.connect_locks.setdefault(ctx.guild.id, asyncio.Lock()):
+            if ctx.voice_client:
+                return ctx.voice_client
+            return await ctx.author.voice.channel.connect(cls=wavelink.Player)
+
+    async def connect_and_search(self, ctx, search):
+        """Joins the author's voice channel while `search` resolves tracks.
+
+        If either step fails the search is abandoned and the connect is left
+        to finish, so no half set up player is left behind.
+        """
+        if ctx.voice_client:
+            # Still warm from the last queue; no handshake needed.
+            return ctx.voice_client, await search
+
+        if ctx.author.voice is None:
+            search.close()
+            raise NoVoiceChannel
+
+        connect = asyncio.ensure_future(self.connect(ctx))
+        search = asyncio.ensure_future(search)
+
+        try:
+            return await asyncio.gather(connect, search)
+        except Exception:
+            search.cancel()
+            # Cancelling a handshake midway can leave the player registered, so
+            # let it finish; play_tracks() then lets the idle timer close it.
+            await asyncio.gather(connect, return_exceptions=True)
+            raise
+
+    @contextlib.asynccontextmanager
+    async def pending_play(self, ctx):
+        """Marks a play command as in progress for the guild.
+
+        Whatever happens inside -- a failed or empty search, a timed-out pick
+        -- a player left with nothing to play gets the idle timer, so the bot
+        never sits in voice indefinitely.
+        """
+        guild_id = ctx.guild.id
+        # Play commands don't go through the mailbox, so cap them the same way.
+        if self.pending_plays[guild_id] >= self.bot.scheduler.mailbox_size:
+            log.warning("Too many play commands pending, dropped `%s`.", ctx.command.qualified_name)
+            raise GuildBusy
+
+        self.cancel_idle_disconnect(guild_id)
+        self.pending_plays[guild_id] += 1
+
+        try:
+            yield
+        finally:
+            self.pending_plays[guild_id] -= 1
+            if not self.pending_plays[guild_id]:
+                del self.pending_plays[guild_id]
+                if (voice_client := await self.get_voice_client(guild_id)) and not voice_client.playing:
+                    self.schedule_idle_disconnect(guild_id)
+
+    async def play_tracks(self, ctx, search):
+        """Shared body of the play commands that search for something."""
+        try:
+            async with self.pending_play(ctx):
+                _, tracks = await self.connect_and_search(ctx, search)
+                await self.add_tracks(ctx, tracks)
+        except GuildBusy:
+            # Refused before the search was ever started.
+            search.close()
+            raise
+
+    async def play_query(self, ctx, query, source):
+        queue = await self.get_queue(ctx.guild.id)
+
+        if query is None:
+            if queue.is_empty:
+                raise QueueIsEmpty
+
+            async with self.pending_play(ctx):
+                if not ctx.voice_client:
+                    if ctx.author.voice is None:
+                        raise NoVoiceChannel
+                    await self.connect(ctx)
 
-        if not player.is_playing() and not queue.is_empty():
-            await self.start_playback(guild_id)
+                await self.bot.scheduler.submit(ctx.guild.id, self.start_playback(ctx.guild.id), bounded=False)
+
+            await ctx.send("Playback resumed.")
+            return
+
+        query = query.strip("<>")
+        # Anything with a host goes to Lavalink as-is, and with the local
+        # source enabled `//etc/...` would load files from the Lavalink host.
+        # Only !local may hand Lavalink a path.
+        parts = urlsplit(query)
+        if (parts.netloc or "://" in query) and parts.scheme not in ("http", "https"):
+            raise UnsupportedURL
+
+        await self.play_tracks(ctx, wavelink.Playable.search(query, source=source))
+
+    async def load_local(self, results):
+        # Each path is loaded through Lavalink's local source; do them together.
+        # The index only holds library files, but check anyway before a path
+        # reaches Lavalink.
+        paths = [r.path for r in results if self.library.contains(r.path)]
+        loaded = await asyncio.gather(*(wavelink.Pool.fetch_tracks(path) for path in paths))
+        return [track for tracks in loaded for track in tracks]
 
     async def choose_track(self, ctx, tracks):
         def _check(r, u):
@@ -285,73 +607,63 @@ class Music(commands.Cog):
             await msg.delete()
             return tracks[OPTIONS[reaction.emoji]]
         
-    @commands.command(name="yt", alias=["youtube"])
+    @commands.command(name="yt", alias=["youtube"], extras={"serialize": False, "starts_player": True})
     async def play_youtube_command(self, ctx, *, query: t.Optional[str]):
         """Play YouTube song `!yt truck got stuck` `!yt https://www.youtube.com/watch?v=4WAxMI1QJMQ`"""
+        await self.play_query(ctx, query, wavelink.TrackSource.YouTube)
 
-        if not ctx.voice_client:
-            vc: wavelink.Player = await ctx.author.voice.channel.connect(cls=wavelink.Player)
-        else:
-            vc: wavelink.Player = ctx.voice_client
-            
-        if query is None:
-            if self.queue.is_empty:
-                raise QueueIsEmpty
-
-            await ctx.send("Playback resumed.")
-
-        else:
-            query = query.strip("<>")
-            if not re.match(URL_REGEX, query):
-                query = f"{query}"
-                
-        node = wavelink.Pool.get_node()
-        player = node.get_player(ctx.guild.id)
-
-        tracks = await wavelink.Playable.search(query)
-        await self.add_tracks(ctx, tracks, vc, player)
-        
-        await vc.play(track)
-        
     @play_youtube_command.error
     async def play_youtube_command_error(self, ctx, exc):
         if isinstance(exc, QueueIsEmpty):
             await ctx.send("No songs to play as the queue is empty.")
         elif isinstance(exc, NoVoiceChannel):
             await ctx.send("No suitable voice channel was provided.")    
-
-    @commands.command(name="sc", alias=["soundcloud", "sound", "cloud"])
+        elif isinstance(exc, NoTracksFound):
+            await ctx.send("No tracks could be found.")
+        elif isinstance(exc, UnsupportedURL):
+            await ctx.send("Only http and https links can be played.")
+        elif isinstance(exc, GuildBusy):
+            await ctx.send("Too many commands are waiting for this server, try again in a moment.")
+
+    @commands.command(name="sc", alias=["soundcloud", "sound", "cloud"], extras={"serialize": False, "starts_player": True})
     async def play_sound_cloud_command(self, ctx, *, query: t.Optional[str]):
         """Play SoundCloud song `!sc https://soundcloud.com/superstar-pride/painting-pictures`"""
-        if not ctx.voice_client:
-            vc: wavelink.Player = await ctx.author.voice.channel.connect(cls=wavelink.Player)
-        else:
-            vc: wavelink.Player = ctx.voice_client
-        
-        if query is None:
-            if self.queue.is_empty:
-                raise QueueIsEmpty
-            
-            await ctx.send("Playback resumed.")
+        await self.play_query(ctx, query, wavelink.TrackSource.SoundCloud)
 
-        else:
-            query = query.strip("<>")
-            if not re.match(URL_REGEX, query):
-                query = f"{query}"
-                
-        node = wavelink.Pool.get_node()
-        player = node.get_player(ctx.guild.id)
-
-        tracks = await wavelink.Playable.search(query)
-        
-        await self.add_tracks(ctx, tracks, vc, player)
-        
     @play_sound_cloud_command.error
     async def play_sound_cloud_command_error(self, ctx, exc):
         if isinstance(exc, QueueIsEmpty):
             await ctx.send("No songs to play as the queue is empty.")
         elif isinstance(exc, NoVoiceChannel):
             await ctx.send("No suitable voice channel was provided.")    
+        elif isinstance(exc, NoTracksFound):
+            await ctx.send("No tracks could be found.")
+        elif isinstance(exc, UnsupportedURL):
+            await ctx.send("Only http and https links can be played.")
+        elif isinstance(exc, GuildBusy):
+            await ctx.send("Too many commands are waiting for this server, try again in a moment.")
+
+    @commands.command(name="local", aliases=["lib"], extras={"serialize": False, "starts_player": True})
+    async def play_local_command(self, ctx, *, query: str):
+        """Play from the local music library `!local daft punk one more time`"""
+        if self.library is None:
+            raise LibraryDisabled
+
+        if not (results := self.library.search(query)):
+            raise NoTracksFound
+
+        await self.play_tracks(ctx, self.load_local(results))
+
+    @play_local_command.error
+    async def play_local_command_error(self, ctx, exc):
+        if isinstance(exc, LibraryDisabled):
+            await ctx.send("The local music library isn't set up on this bot.")
+        elif isinstance(exc, NoTracksFound):
+            await ctx.send("Nothing in the local library matches that.")
+        elif isinstance(exc, NoVoiceChannel):
+            await ctx.send("No suitable voice channel was provided.")
+        elif isinstance(exc, GuildBusy):
+            await ctx.send("Too many commands are waiting for this server, try again in a moment.")
 
     @commands.command(name="pause")
     async def pause_command(self, ctx):
@@ -382,25 +694,31 @@ class Music(commands.Cog):
     @commands.command(name="stop")
     async def stop_command(self, ctx):
         """Stop playing song.""" 
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
-        self.queue.empty()
+        queue.empty()
         await player.stop()
+        # A stopped track doesn't advance the queue, so nothing else would.
+        self.schedule_idle_disconnect(ctx.guild.id)
         await ctx.send("Playback stopped.")
 
     @commands.command(name="next", aliases=["skip"])
     async def next_command(self, ctx):
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
 
-        if not self.queue.upcoming:
+        if not queue.upcoming:
             await player.stop()
+            self.schedule_idle_disconnect(ctx.guild.id)
             raise NoMoreTracks
 
-        await player.stop()
+        # play() replaces the current track in one step; stopping first would
+        # fire a track end that advances the queue a second time.
         await ctx.send("Playing next track in queue.")
 
-        new_track = self.queue.get_next_track()
+        new_track = queue.get_next_track()
         await player.play(new_track)
 
     @next_command.error
@@ -413,18 +731,18 @@ class Music(commands.Cog):
     @commands.command(name="previous")
     async def previous_command(self, ctx):
         """Play previous song."""
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
 
-        if not self.queue.history:
+        if not queue.history:
             await player.stop()
             raise NoPreviousTracks
 
-        self.queue.position -= 1
-        await player.stop()
+        queue.position -= 1
         await ctx.send("Playing previous track in queue.")
         
-        await player.play(self.queue.current_track)
+        await player.play(queue.current_track)
 
     @previous_command.error
     async def previous_command_error(self, ctx, exc):
@@ -436,9 +754,10 @@ class Music(commands.Cog):
     @commands.command(name="shuffle")
     async def shuffle_command(self, ctx):
         """Suffle songs."""
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
-        self.queue.shuffle()
+        queue.shuffle()
         await ctx.send("Queue shuffled.")
 
     @shuffle_command.error
@@ -449,6 +768,7 @@ class Music(commands.Cog):
     @commands.command(name="repeat")
     async def repeat_command(self, ctx, mode: str):
         """Repeat song. `!repeat all` `!repeat 1` `!repeat none`"""
+        queue = await self.get_queue(ctx.guild.id)
         if mode is None:
             raise MissingRequiredArgument
         
@@ -457,7 +777,7 @@ class Music(commands.Cog):
 
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
-        self.queue.set_repeat_mode(mode)
+        queue.set_repeat_mode(mode)
         await ctx.send(f"The repeat mode has been set to {mode}.")
         
     @repeat_command.error
@@ -470,7 +790,8 @@ class Music(commands.Cog):
     @commands.command(name="queue")
     async def queue_command(self, ctx, show: t.Optional[int] = 10):
         """Show the queue"""
-        if self.queue.is_empty:
+        queue = await self.get_queue(ctx.guild.id)
+        if queue.is_empty:
             raise QueueIsEmpty
 
         embed = discord.Embed(
@@ -483,10 +804,10 @@ class Music(commands.Cog):
         embed.set_footer(text=f"Requested by {ctx.author.display_name}", icon_url=ctx.author.avatar)
         embed.add_field(
             name="Currently playing",
-            value=getattr(self.queue.current_track, "title", "No tracks currently playing."),
+            value=getattr(queue.current_track, "title", "No tracks currently playing."),
             inline=False
         )
-        if upcoming := self.queue.upcoming:
+        if upcoming := queue.upcoming:
             embed.add_field(
                 name="Next up",
                 value="\n".join(t.title for t in upcoming[:show]),
@@ -504,16 +825,13 @@ class Music(commands.Cog):
 
     @commands.group(name="volume", invoke_without_command=True)
     async def volume_group(self, ctx, volume: int):
-        node = wavelink.Pool.get_node()
-        player = node.get_player(ctx.guild.id)
-
         if volume < 0:
             raise VolumeTooLow
 
         if volume > 150:
             raise VolumeTooHigh
 
-        await player.set_volume(volume)
+        await self.set_volume(ctx, volume)
         await ctx.send(f"Volume set to {volume:,}%")
 
     @volume_group.error
@@ -523,15 +841,23 @@ class Music(commands.Cog):
         elif isinstance(exc, VolumeTooHigh):
             await ctx.send("The volume must be 150% or below.")
 
+    async def set_volume(self, ctx, volume):
+        # Stored with the filters so a reconnect doesn't reset it to 100.
+        state = await self.get_filters(ctx.guild.id)
+        state.volume = volume
+
+        node = wavelink.Pool.get_node()
+        if (player := node.get_player(ctx.guild.id)) is not None:
+            await player.set_volume(volume)
+
     @volume_group.command(name="up")
     async def volume_up_command(self, ctx):
-        node = wavelink.Pool.get_node()
-        player = node.get_player(ctx.guild.id)
+        state = await self.get_filters(ctx.guild.id)
 
-        if player.volume == 150:
+        if state.volume == 150:
             raise MaxVolume
 
-        await player.set_volume(value := min(player.volume + 10, 150))
+        await self.set_volume(ctx, value := min(state.volume + 10, 150))
         await ctx.send(f"Volume set to {value:,}%")
 
     @volume_up_command.error
@@ -541,13 +867,12 @@ class Music(commands.Cog):
 
     @volume_group.command(name="down")
     async def volume_down_command(self, ctx):
-        node = wavelink.Pool.get_node()
-        player = node.get_player(ctx.guild.id)
+        state = await self.get_filters(ctx.guild.id)
 
-        if player.volume == 0:
+        if state.volume == 0:
             raise MinVolume
 
-        await player.set_volume(value := max(0, player.volume - 10))
+        await self.set_volume(ctx, value := max(0, state.volume - 10))
         await ctx.send(f"Volume set to {value:,}%")
 
     @volume_down_command.error
@@ -555,15 +880,17 @@ class Music(commands.Cog):
         if isinstance(exc, MinVolume):
             await ctx.send("The player is already at min volume.")
 
-    @commands.command(name="lyrics")
+    @commands.command(name="lyrics", extras={"serialize": False})
     async def lyrics_command(self, ctx, name: t.Optional[str]):
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
-        name = name or self.queue.current_track.title
+        name = name or queue.current_track.title
 
         async with ctx.typing():
             async with aiohttp.request("GET", LYRICS_URL + name, headers={}) as r:
                 if not 200 <= r.status <= 299:
+                    log.warning("Lyrics lookup failed with HTTP %d.", r.status)
                     raise NoLyricsFound
 
                 data = await r.json()
@@ -591,11 +918,12 @@ class Music(commands.Cog):
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
 
-        eq = getattr(wavelink.eqs.Equalizer, preset, None)
-        if not eq:
+        if preset not in EQ_PRESETS:
             raise InvalidEQPreset
 
-        await player.set_eq(eq())
+        state = await self.get_filters(ctx.guild.id)
+        state.set_preset(preset)
+        state.schedule_push(player)
         await ctx.send(f"Equaliser adjusted to the {preset} preset.")
 
     @eq_command.error
@@ -617,9 +945,9 @@ class Music(commands.Cog):
         if abs(gain) > 10:
             raise EQGainOutOfBounds
 
-        player.eq_levels[band - 1] = gain / 10
-        eq = wavelink.eqs.Equalizer(levels=[(i, gain) for i, gain in enumerate(player.eq_levels)])
-        await player.set_eq(eq)
+        state = await self.get_filters(ctx.guild.id)
+        state.set_band(band - 1, gain / 10)
+        state.schedule_push(player)
         await ctx.send("Equaliser adjusted.")
 
     @adveq_command.error
@@ -632,9 +960,54 @@ class Music(commands.Cog):
         elif isinstance(exc, EQGainOutOfBounds):
             await ctx.send("The EQ gain for any band should be between 10 dB and -10 dB.")
 
+    @commands.command(name="speed")
+    async def speed_command(self, ctx, speed: float):
+        """Change playback speed. `!speed 1.25`"""
+        await self.set_timescale(ctx, speed=speed)
+        await ctx.send(f"Speed set to {speed:g}x.")
+
+    @commands.command(name="pitch")
+    async def pitch_command(self, ctx, pitch: float):
+        """Change pitch without changing speed. `!pitch 0.8`"""
+        await self.set_timescale(ctx, pitch=pitch)
+        await ctx.send(f"Pitch set to {pitch:g}x.")
+
+    async def set_timescale(self, ctx, **options):
+        if not all(0.5 <= v <= 2.0 for v in options.values()):
+            raise TimescaleOutOfBounds
+
+        node = wavelink.Pool.get_node()
+        player = node.get_player(ctx.guild.id)
+
+        state = await self.get_filters(ctx.guild.id)
+        state.set_timescale(**options)
+        state.schedule_push(player)
+
+    @speed_command.error
+    async def speed_command_error(self, ctx, exc):
+        if isinstance(exc, TimescaleOutOfBounds):
+            await ctx.send("The speed must be between 0.5 and 2.")
+
+    @pitch_command.error
+    async def pitch_command_error(self, ctx, exc):
+        if isinstance(exc, TimescaleOutOfBounds):
+            await ctx.send("The pitch must be between 0.5 and 2.")
+
+    @commands.command(name="resetfilters", aliases=["nofilters"])
+    async def reset_filters_command(self, ctx):
+        """Clear the equaliser, speed and pitch."""
+        node = wavelink.Pool.get_node()
+        player = node.get_player(ctx.guild.id)
+
+        state = await self.get_filters(ctx.guild.id)
+        state.reset()
+        state.schedule_push(player)
+        await ctx.send("Filters reset.")
+
     @commands.command(name="playing", aliases=["np"])
     async def playing_command(self, ctx):
         """Shows current playing song."""
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
 
@@ -648,11 +1021,11 @@ class Music(commands.Cog):
         )
         embed.set_author(name="Playback Information")
         embed.set_footer(text=f"Requested by {ctx.author.display_name}", icon_url=ctx.author.avatar)
-        embed.add_field(name="Track title", value=self.queue.current_track.title, inline=False)
-        embed.add_field(name="Artist", value=self.queue.current_track.author, inline=False)
+        embed.add_field(name="Track title", value=queue.current_track.title, inline=False)
+        embed.add_field(name="Artist", value=queue.current_track.author, inline=False)
 
         position = divmod(player.position, 60000)
-        length = divmod(self.queue.current_track.length, 60000)
+        length = divmod(queue.current_track.length, 60000)
         embed.add_field(
             name="Position",
             value=f"{int(position[0])}:{round(position[1]/1000):02}/{int(length[0])}:{round(length[1]/1000):02}",
@@ -668,17 +1041,18 @@ class Music(commands.Cog):
 
     @commands.command(name="skipto", aliases=["playindex"])
     async def skipto_command(self, ctx, index: int):
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
 
-        if self.queue.is_empty:
+        if queue.is_empty:
             raise QueueIsEmpty
 
-        if not 0 <= index <= self.queue.length:
+        if not 1 <= index <= queue.length:
             raise NoMoreTracks
 
-        self.queue.position = index - 2
-        await player.stop()
+        queue.position = index - 1
+        await player.play(queue.current_track)
         await ctx.send(f"Playing track in position {index}.")
 
     @skipto_command.error
@@ -690,10 +1064,11 @@ class Music(commands.Cog):
 
     @commands.command(name="restart")
     async def restart_command(self, ctx):
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
 
-        if self.queue.is_empty:
+        if queue.is_empty:
             raise QueueIsEmpty
 
         await player.seek(0)
@@ -706,10 +1081,11 @@ class Music(commands.Cog):
 
     @commands.command(name="seek")
     async def seek_command(self, ctx, position: str):
+        queue = await self.get_queue(ctx.guild.id)
         node = wavelink.Pool.get_node()
         player = node.get_player(ctx.guild.id)
 
-        if self.queue.is_empty:
+        if queue.is_empty:
             raise QueueIsEmpty
 
         if not (match := re.match(TIME_REGEX, position)):
@@ -0,0 +1,57 @@
+import logging
+
+from discord.ext import commands
+
+log = logging.getLogger(__name__)
+
+MAX_PREFIX_LENGTH = 5
+
+
+class PrefixTooLong(commands.CommandError):
+    pass
+
+
+class Settings(commands.Cog):
+    def __init__(self, bot, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bot = bot
+
+    @commands.group(name="prefix", invoke_without_command=True)
+    @commands.guild_only()
+    async def prefix_group(self, ctx):
+        """Show the command prefix for this server."""
+        await ctx.send(f"The prefix here is `{self.bot.prefixes.get(ctx.guild.id)}`.")
+
+    @prefix_group.command(name="set")
+    @commands.has_guild_permissions(manage_guild=True)
+    async def prefix_set_command(self, ctx, prefix: str):
+        """Change the command prefix for this server. `!prefix set ?`"""
+        if len(prefix) > MAX_PREFIX_LENGTH:
+            raise PrefixTooLong
+
+        self.bot.prefixes.set(ctx.guild.id, prefix)
+        log.info("Prefix changed to %r.", prefix)
+        await ctx.send(f"Prefix set to `{prefix}`.")
+
+    @prefix_set_command.error
+    async def prefix_set_command_error(self, ctx, exc):
+        if isinstance(exc, PrefixTooLong):
+            await ctx.send(f"The prefix can be at most {MAX_PREFIX_LENGTH} characters long.")
+        elif isinstance(exc, commands.MissingPermissions):
+            await ctx.send("You need the Manage Server permission to change the prefix.")
+
+    @prefix_group.command(name="reset")
+    @commands.has_guild_permissions(manage_guild=True)
+    async def prefix_reset_command(self, ctx):
+        """Go back to the default command prefix."""
+        self.bot.prefixes.reset(ctx.guild.id)
+        await ctx.send(f"Prefix reset to `{self.bot.prefixes.default}`.")
+
+    @prefix_reset_command.error
+    async def prefix_reset_command_error(self, ctx, exc):
+        if isinstance(exc, commands.MissingPermissions):
+            await ctx.send("You need the Manage Server permission to change the prefix.")
+
+
+async def setup(bot):
+    await bot.add_cog(Settings(bot))
@@ -0,0 +1,165 @@
+import collections
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+try:
+    import mutagen
+except ImportError:
+    mutagen = None
+
+AUDIO_EXTENSIONS = frozenset((".mp3", ".flac", ".ogg", ".opus", ".m4a", ".aac", ".wav"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    length INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+    title, artist, album, content='tracks', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+    INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.id, new.title, new.artist, new.album);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+    INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album) VALUES ('delete', old.id, old.title, old.artist, old.album);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE ON tracks BEGIN
+    INSERT INTO tracks_fts(tracks_fts, rowid, title, artist, album) VALUES ('delete', old.id, old.title, old.artist, old.album);
+    INSERT INTO tracks_fts(rowid, title, artist, album) VALUES (new.id, new.title, new.artist, new.album);
+END;
+"""
+
+LibraryTrack = collections.namedtuple("LibraryTrack", "path title artist album length")
+
+
+def read_tags(path):
+    """Returns `(title, artist, album, length_ms)` for an audio file.
+
+    Falls back to an `Artist - Title` file name when mutagen isn't installed
+    or the file has no usable tags.
+    """
+    title = artist = album = None
+    length = None
+
+    if mutagen is not None:
+        try:
+            audio = mutagen.File(path, easy=True)
+        except Exception:
+            audio = None
+
+        if audio is not None:
+            tags = audio.tags or {}
+            title = (tags.get("title") or [None])[0]
+            artist = (tags.get("artist") or [None])[0]
+            album = (tags.get("album") or [None])[0]
+            if getattr(audio, "info", None) is not None:
+                length = int(audio.info.length * 1000)
+
+    if title is None:
+        stem = Path(path).stem
+        if " - " in stem and artist is None:
+            artist, title = stem.split(" - ", 1)
+        else:
+            title = stem
+
+    return title, artist, album, length
+
+
+class Library:
+    """Index of local audio files, stored in SQLite with an FTS5 table over
+    title, artist and album.
+
+    `scan()` walks the configured directories and only re-reads files whose
+    mtime changed; it blocks, so run it in an executor. `search()` is a single
+    indexed query and is cheap enough to call on the event loop.
+
+    Paths are handed to Lavalink's local source as they are, so Lavalink must
+    see the same filesystem.
+    """
+
+    def __init__(self, path, directories):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.directories = [os.path.abspath(d) for d in directories]
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        # WAL lets the indexer write while searches keep reading.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def close(self):
+        self._conn.close()
+
+    def contains(self, path):
+        """Whether `path` lies inside one of the library directories."""
+        path = os.path.realpath(path)
+        return any(os.path.commonpath((path, os.path.realpath(d))) == os.path.realpath(d) for d in self.directories)
+
+    def scan(self):
+        """Brings the index in line with the directories.
+
+        Returns `(changed, removed)` file counts.
+        """
+        conn = self._connect()
+        try:
+            known = dict(conn.execute("SELECT path, mtime FROM tracks"))
+            seen = set()
+            changed = 0
+
+            for directory in self.directories:
+                for root, _, files in os.walk(directory):
+                    for name in files:
+                        if os.path.splitext(name)[1].lower() not in AUDIO_EXTENSIONS:
+                            continue
+
+                        path = os.path.join(root, name)
+                        try:
+                            mtime = os.stat(path).st_mtime
+                        except OSError:
+                            continue
+
+                        seen.add(path)
+                        if known.get(path) == mtime:
+                            continue
+
+                        conn.execute(
+                            "INSERT INTO tracks (path, mtime, title, artist, album, length) VALUES (?, ?, ?, ?, ?, ?) "
+                            "ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime, title = excluded.title, "
+                            "artist = excluded.artist, album = excluded.album, length = excluded.length",
+                            (path, mtime, *read_tags(path)),
+                        )
+                        changed += 1
+
+            removed = known.keys() - seen
+            conn.executemany("DELETE FROM tracks WHERE path = ?", ((p,) for p in removed))
+            conn.commit()
+        finally:
+            conn.close()
+
+        return changed, len(removed)
+
+    def search(self, query, limit=5):
+        # Every word must match, as a prefix, in any of the indexed columns.
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+
+        match = " ".join(f'"{w}"*' for w in words)
+        rows = self._conn.execute(
+            "SELECT t.path, t.title, t.artist, t.album, t.length FROM tracks_fts "
+            "JOIN tracks t ON t.id = tracks_fts.rowid WHERE tracks_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit),
+        )
+        return [LibraryTrack(*row) for row in rows]
@@ -0,0 +1,226 @@
+import contextvars
+import datetime as dt
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# Guild the current task is working for. Set it at the start of a command or
+# player event and every record logged from that task is tagged with it.
+guild_context = contextvars.ContextVar("guild_context", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`.
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class GuildContextFilter(logging.Filter):
+    """Tags records with the guild from `guild_context` on the calling task."""
+
+    def filter(self, record):
+        if getattr(record, "guild_id", None) is None:
+            record.guild_id = guild_context.get()
+        return True
+
+
+class RepeatFilter(logging.Filter):
+    """Drops identical records logged again within `window` seconds.
+
+    Suppressed records are counted, never lost silently: the first record
+    after the window closes carries a `suppressed` count, and if none comes,
+    `emit` is handed a summary record with the count once the window has
+    expired. Summaries bypass the filters, so `emit` must not call back into
+    the handler's `handle()`.
+    """
+
+    def __init__(self, window=10.0, max_keys=1024, emit=None):
+        super().__init__()
+        self.window = window
+        self.max_keys = max_keys
+        self.emit = emit
+        self._seen = {}
+        self._next_sweep = 0.0
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.getMessage(), getattr(record, "guild_id", None))
+        now = time.monotonic()
+
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        last, count = self._seen.get(key, (None, 0))
+
+        if last is not None and now - last < self.window:
+            self._seen[key] = (last, count + 1)
+            return False
+
+        if count:
+            record.suppressed = count
+
+        if len(self._seen) >= self.max_keys:
+            self._sweep(now)
+            if len(self._seen) >= self.max_keys:
+                # Every key is still live; report what we have and start over.
+                self._report(list(self._seen))
+
+        self._seen[key] = (now, 0)
+        return True
+
+    def _sweep(self, now):
+        self._next_sweep = now + self.window
+        self._report([k for k, (last, _) in self._seen.items() if now - last >= self.window])
+
+    def _report(self, keys):
+        for key in keys:
+            _, count = self._seen.pop(key)
+            if count and self.emit is not None:
+                name, levelno, message, guild_id = key
+                self.emit(logging.makeLogRecord({
+                    "name": name,
+                    "levelno": levelno,
+                    "levelname": logging.getLevelName(levelno),
+                    "msg": message,
+                    "guild_id": guild_id,
+                    "suppressed": count,
+                }))
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": dt.datetime.fromtimestamp(record.created, dt.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS and v is not None})
+
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without ever waiting on it.
+
+    If the queue is full the record is dropped and counted; the count is
+    reported with the next record that does get through.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only do the cheap part here; JSON encoding happens on the listener thread.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        if self.dropped:
+            record.dropped, self.dropped = self.dropped, 0
+
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class GzipRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """Rotates on size or at midnight, whichever comes first.
+
+    Rotated files are gzipped and named like Lavalink's own logs
+    (`bot.log.2022-08-14.0.gz`), keeping the newest `backup_count`.
+    """
+
+    def __init__(self, filename, max_bytes=100 * 1024 * 1024, backup_count=30):
+        super().__init__(filename, "a", encoding="utf-8", delay=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._day = self._today()
+
+    @staticmethod
+    def _today():
+        return dt.date.today().isoformat()
+
+    def shouldRollover(self, record):
+        if self._today() != self._day:
+            return True
+
+        if self.stream is None:
+            self.stream = self._open()
+
+        return self.stream.tell() >= self.max_bytes
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        base = Path(self.baseFilename)
+        if base.exists() and base.stat().st_size:
+            index = 0
+            while (dest := base.with_name(f"{base.name}.{self._day}.{index}.gz")).exists():
+                index += 1
+
+            with open(base, "rb") as src, gzip.open(dest, "wb") as out:
+                shutil.copyfileobj(src, out)
+            base.unlink()
+
+        backups = sorted(base.parent.glob(f"{base.name}.*.gz"), key=os.path.getmtime)
+        for old in backups[:max(0, len(backups) - self.backup_count)]:
+            old.unlink()
+
+        self._day = self._today()
+        self.stream = self._open()
+
+
+def setup_logging(directory=None, level=None):
+    """Routes all logging through a background thread writing JSON lines.
+
+    Returns the started `QueueListener`; stop it on shutdown to flush.
+    """
+    directory = Path(directory or os.getenv("LOG_DIR", "logs"))
+    directory.mkdir(parents=True, exist_ok=True)
+
+    formatter = JSONFormatter()
+    file_handler = GzipRotatingFileHandler(
+        directory / "bot.log",
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", 100 * 1024 * 1024)),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", 30)),
+    )
+    stream_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=10000))
+    queue_handler.addFilter(GuildContextFilter())
+    queue_handler.addFilter(RepeatFilter(
+        window=float(os.getenv("LOG_REPEAT_WINDOW", 10.0)),
+        # Straight onto the queue; handle() would run the summary through
+        # the filters again.
+        emit=lambda record: queue_handler.enqueue(queue_handler.prepare(record)),
+    ))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO"))
+
+    listener = logging.handlers.QueueListener(queue_handler.queue, file_handler, stream_handler)
+    listener.start()
+    return listener
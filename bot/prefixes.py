@@ -0,0 +1,48 @@
+import sqlite3
+from pathlib import Path
+
+
+class PrefixStore:
+    """Per-guild command prefixes, persisted in SQLite and cached in memory.
+
+    Every incoming message needs its guild's prefix, so the database is only
+    read the first time a guild is seen (guilds using the default are cached
+    too). `set` and `reset` write through and drop the cached entry.
+    """
+
+    def __init__(self, path, default):
+        self.default = default
+        self._cache = {}
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS prefixes (guild_id INTEGER PRIMARY KEY, prefix TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, guild_id):
+        try:
+            return self._cache[guild_id]
+        except KeyError:
+            pass
+
+        row = self._conn.execute("SELECT prefix FROM prefixes WHERE guild_id = ?", (guild_id,)).fetchone()
+        prefix = self._cache[guild_id] = row[0] if row else self.default
+        return prefix
+
+    def set(self, guild_id, prefix):
+        self._conn.execute(
+            "INSERT INTO prefixes (guild_id, prefix) VALUES (?, ?) "
+            "ON CONFLICT(guild_id) DO UPDATE SET prefix = excluded.prefix",
+            (guild_id, prefix),
+        )
+        self._conn.commit()
+        self._cache.pop(guild_id, None)
+
+    def reset(self, guild_id):
+        self._conn.execute("DELETE FROM prefixes WHERE guild_id = ?", (guild_id,))
+        self._conn.commit()
+        self._cache.pop(guild_id, None)
+
+    def close(self):
+        self._conn.close()
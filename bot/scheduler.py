@@ -0,0 +1,110 @@
+import asyncio
+import collections
+import logging
+
+from discord.ext import commands
+
+from .log import guild_context
+
+log = logging.getLogger(__name__)
+
+
+class GuildBusy(commands.CommandError):
+    pass
+
+
+class GuildScheduler:
+    """Runs each guild's jobs strictly in order, sharing a fixed pool of workers
+    fairly between guilds.
+
+    Every guild has a bounded mailbox. A guild with pending jobs waits in a
+    round-robin ready queue; a worker takes the guild at the front, runs one
+    job and sends the guild to the back if it still has work. A guild is never
+    in the ready queue twice, so its jobs can't overlap and a noisy guild gets
+    one turn per round like everyone else.
+    """
+
+    def __init__(self, workers=16, mailbox_size=8):
+        self.workers = workers
+        self.mailbox_size = mailbox_size
+        self._mailboxes = {}
+        self._running = set()
+        self._ready = None
+        self._tasks = []
+        self._stopping = False
+
+    def start(self):
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        for mailbox in self._mailboxes.values():
+            for coro, fut in mailbox:
+                coro.close()
+                fut.cancel()
+        self._mailboxes.clear()
+
+    def submit(self, guild_id, coro, bounded=True):
+        """Queues `coro` behind the guild's earlier jobs and returns a future
+        for its result.
+
+        Raises `GuildBusy` if the mailbox is full; pass `bounded=False` for
+        jobs that must not be dropped, such as player events.
+        """
+        mailbox = self._mailboxes.setdefault(guild_id, collections.deque())
+
+        if bounded and len(mailbox) >= self.mailbox_size:
+            coro.close()
+            raise GuildBusy
+
+        fut = asyncio.get_running_loop().create_future()
+        mailbox.append((coro, fut))
+
+        # A guild that already had jobs is either queued or being worked on;
+        # whoever holds it will pick this job up.
+        if len(mailbox) == 1 and guild_id not in self._running:
+            self._ready.put_nowait(guild_id)
+
+        return fut
+
+    async def _worker(self):
+        while True:
+            guild_id = await self._ready.get()
+            mailbox = self._mailboxes[guild_id]
+            coro, fut = mailbox.popleft()
+            self._running.add(guild_id)
+            guild_context.set(guild_id)
+
+            try:
+                if fut.cancelled():
+                    coro.close()
+                else:
+                    result = await coro
+            except asyncio.CancelledError:
+                fut.cancel()
+                if self._stopping:
+                    raise
+                # The job was cancelled from inside (a timeout, a cancelled
+                # task it awaited); that ends the job, not the worker.
+                log.warning("Job was cancelled.")
+            except Exception as exc:
+                if not fut.done():
+                    fut.set_exception(exc)
+                else:
+                    log.exception("Job failed after its caller went away.")
+            else:
+                if not fut.done():
+                    fut.set_result(result)
+            finally:
+                self._running.discard(guild_id)
+                # Hand the guild back even if this worker is going away, so its
+                # other jobs aren't stranded.
+                if mailbox:
+                    self._ready.put_nowait(guild_id)
+                else:
+                    del self._mailboxes[guild_id]